@@ -1,29 +1,41 @@
 import asyncio
 import logging
+import logging.handlers
+import queue
+import re
+from typing import Dict, List, Optional
 from config import CONFIG
 from credentials import Credentials
 from history import PostHistory
+from response_cache import ResponseCache
 from rss_manager import RSSFeedManager
-from twitter_bot import TwitterBot
+from twitter_bot import PostResult, TwitterBot
 from models import Article
-from xai_chat import XAIChat  # Assuming a separate module for the XAIChat logic
+from xai_chat import XAIChat, close_connector  # Assuming a separate module for the XAIChat logic
 from prompt_manager import PromptManager
 from thread_generator import ThreadGenerator
 
-from requests_oauthlib import OAuth1Session
-import time
-
-# Configure logging
+# Configure logging; records are queued and written by a background thread
+# so file and console I/O never block the event loop
+log_queue = queue.SimpleQueue()
 logging.basicConfig(
     level=logging.INFO,  # Default; overridden by CONFIG['log_level'] later
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("twitter_bot.log"),
-        logging.StreamHandler(),
-    ],
+    handlers=[logging.handlers.QueueHandler(log_queue)],
+)
+log_listener = logging.handlers.QueueListener(
+    log_queue,
+    logging.FileHandler("twitter_bot.log"),
+    logging.StreamHandler(),
 )
 logger = logging.getLogger(__name__)
 
+# Indicators of research-style content, matched in a single case-insensitive pass
+_COMPLEX_CONTENT_RE = re.compile(
+    r"research|study|analysis|findings|methodology|results show|according to",
+    re.IGNORECASE,
+)
+
 
 async def process_feed(
     feed_url: str,
@@ -31,88 +43,129 @@ async def process_feed(
     chat_client: XAIChat,
     twitter_bot: TwitterBot,
     post_history: PostHistory,
+    response_cache: ResponseCache,
+    prompt_manager: PromptManager,
+    thread_generator: ThreadGenerator,
+    post_lock: asyncio.Lock,
+    tweet_posted: asyncio.Event,
 ) -> bool:
     """Process a single feed to find and tweet a suitable article."""
     try:
-        articles = await rss_manager.fetch_feed(feed_url)
-        prompt_manager = PromptManager()
-        thread_generator = ThreadGenerator()
-        
-        for article in articles:
-            if article.is_recent(CONFIG["article_freshness_hours"]) and not post_history.is_posted(article):
+        candidates = rss_manager.iter_candidates(
+            feed_url,
+            CONFIG["article_freshness_hours"],
+            post_history,
+        )
+        has_candidates = False
+        async for article in candidates:
+            has_candidates = True
+            # Another feed already posted this run; skip any further LLM calls
+            if tweet_posted.is_set():
+                return False
+
+            # Generation and posting share one lock: only the first post of the run
+            # counts, so completions requested in parallel would be paid for and
+            # then thrown away. Feed fetching above still overlaps across feeds.
+            async with post_lock:
+                if tweet_posted.is_set():
+                    return False
+
                 # Determine if content should be a thread based on length and complexity
                 should_thread = _should_create_thread(article.content)
-                
+
                 if should_thread:
                     # Generate thread content
-                    thread_content = await chat_client.chat(
-                        prompt_manager.get_thread_prompt(
-                            article.title,
-                            article.content,
-                            article.url
-                        )
+                    messages = prompt_manager.get_thread_prompt(
+                        article.title,
+                        article.content,
+                        article.url
+                    )
+                    thread_content = await _generate(
+                        chat_client,
+                        response_cache,
+                        article,
+                        messages
                     )
-                    
+
                     if thread_content:
                         # Parse the AI response into thread parts
                         thread_parts = thread_generator.parse_ai_response(thread_content)
-                        if await twitter_bot.post_thread(thread_parts):
+                        result = await twitter_bot.post_thread(thread_parts)
+                        if result is PostResult.OK:
+                            tweet_posted.set()
                             await post_history.add_posted(article)
                             logger.info(f"Successfully posted thread for article: {article.title}")
                             return True
+                        if result is PostResult.REJECTED:
+                            await _discard_rejected(response_cache, article, messages)
                 else:
                     # Generate single tweet
-                    tweet_text = await chat_client.chat(
-                        prompt_manager.get_single_tweet_prompt(
-                            article.title,
-                            article.content,
-                            article.url
-                        )
+                    messages = prompt_manager.get_single_tweet_prompt(
+                        article.title,
+                        article.content,
+                        article.url
+                    )
+                    tweet_text = await _generate(
+                        chat_client,
+                        response_cache,
+                        article,
+                        messages
                     )
-                    
-                    if tweet_text and await twitter_bot.post_tweet(tweet_text):
-                        await post_history.add_posted(article)
-                        logger.info(f"Successfully posted tweet for article: {article.title}")
-                        return True
-        
+
+                    if tweet_text:
+                        result = await twitter_bot.post_tweet(tweet_text)
+                        if result is PostResult.OK:
+                            tweet_posted.set()
+                            await post_history.add_posted(article)
+                            logger.info(f"Successfully posted tweet for article: {article.title}")
+                            return True
+                        if result is PostResult.REJECTED:
+                            await _discard_rejected(response_cache, article, messages)
+
+        if not has_candidates:
+            # Nothing recent and unposted; skip this feed until it changes
+            rss_manager.mark_exhausted(feed_url)
         return False
 
     except Exception as e:
         logger.error(f"Error processing feed {feed_url}: {str(e)}")
         return False
 
+async def _generate(
+    chat_client: XAIChat,
+    response_cache: ResponseCache,
+    article: Article,
+    messages: List[Dict[str, str]],
+) -> Optional[str]:
+    """Return a cached response for this article and prompt, or ask xAI for one."""
+    key = response_cache.make_key(article, messages)
+    cached = response_cache.get(key)
+    if cached:
+        logger.info(f"Reusing cached response for article: {article.title}")
+        return cached
+
+    response = await chat_client.chat(messages)
+    if response:
+        await response_cache.set(key, response)
+    return response
+
+async def _discard_rejected(
+    response_cache: ResponseCache,
+    article: Article,
+    messages: List[Dict[str, str]],
+) -> None:
+    """Forget a cached response Twitter refused, so it isn't replayed on later runs."""
+    logger.info(f"Discarding rejected response for article: {article.title}")
+    await response_cache.discard(response_cache.make_key(article, messages))
+
 def _should_create_thread(content: str) -> bool:
     """Determine if content should be a thread based on length and complexity."""
     # Basic heuristic - can be expanded based on your needs
-    word_count = len(content.split())
-    has_complex_content = any(indicator in content.lower() for indicator in [
-        "research",
-        "study",
-        "analysis",
-        "findings",
-        "methodology",
-        "results show",
-        "according to"
-    ])
-    
-    return word_count > 100 or has_complex_content
+    # Approximate the word count by counting spaces; avoids building a token list
+    word_count = content.count(" ") + 1
+    has_complex_content = _COMPLEX_CONTENT_RE.search(content) is not None
 
-def exponential_backoff_retry(request_func, max_retries=5):
-    retry_delay = 10  # start with 10 seconds delay
-    for attempt in range(max_retries):
-        response = request_func()
-        if response.status_code == 201:
-            return response
-        elif response.status_code == 429:
-            print(f"Rate limit exceeded, retrying in {retry_delay} seconds...")
-            time.sleep(retry_delay)
-            retry_delay *= 2  # double the delay for the next attempt
-        else:
-            print(
-                f"Failed to post tweet with status {response.status_code}: {response.text}"
-            )
-            break
-    return None
+    return word_count > 100 or has_complex_content
 
 async def main():
     """Main entry point for the Twitter bot."""
@@ -130,41 +183,65 @@ async def main():
         # Initialize components
         logger.info("Initializing components...")
         post_history = PostHistory()
+        response_cache = ResponseCache()
         rss_manager = RSSFeedManager()
         chat_client = XAIChat(credentials.xai_api_key)
-        
-        oauth = OAuth1Session(
+        prompt_manager = PromptManager()
+        thread_generator = ThreadGenerator()
+        twitter_bot = TwitterBot(
             credentials.oauth_consumer_key,
-            client_secret=credentials.oauth_consumer_secret,
-            resource_owner_key=credentials.oauth_access_token,
-            resource_owner_secret=credentials.oauth_access_token_secret,
+            credentials.oauth_consumer_secret,
+            credentials.oauth_access_token,
+            credentials.oauth_access_token_secret,
         )
-        twitter_bot = TwitterBot(oauth)
         logger.info("All components initialized successfully")
 
         # Clean up old history entries
         logger.info("Cleaning up old history entries...")
         await post_history.cleanup_old_entries(days=CONFIG["history_retention_days"])
+        await response_cache.cleanup_old_entries(days=CONFIG["history_retention_days"])
 
-        # Get all feeds in random order
-        feeds = rss_manager.get_random_feeds(count=len(rss_manager.feeds))
+        # Get a random selection of feeds for this run
+        feeds = rss_manager.get_random_feeds(count=CONFIG["max_feeds_per_run"])
         logger.info(f"Loaded {len(feeds)} feeds for processing.")
 
-        # Process feeds until a tweet is posted
-        for feed_url in feeds:
-            logger.info(f"Processing feed: {feed_url}")
-            tweet_posted = await process_feed(
-                feed_url,
-                rss_manager,
-                chat_client,
-                twitter_bot,
-                post_history,
-            )
-            if tweet_posted:
-                logger.info("Successfully posted one tweet, finishing process.")
-                break
-        else:
-            logger.warning("No suitable articles found across all feeds.")
+        # Process feeds concurrently until a tweet is posted
+        semaphore = asyncio.Semaphore(CONFIG.get("feed_concurrency", 8))
+        # Serializes generation and posting so at most one completion is in flight
+        post_lock = asyncio.Lock()
+        tweet_posted = asyncio.Event()
+
+        async def process_feed_bounded(feed_url: str) -> bool:
+            async with semaphore:
+                if tweet_posted.is_set():
+                    return False
+                logger.info(f"Processing feed: {feed_url}")
+                return await process_feed(
+                    feed_url,
+                    rss_manager,
+                    chat_client,
+                    twitter_bot,
+                    post_history,
+                    response_cache,
+                    prompt_manager,
+                    thread_generator,
+                    post_lock,
+                    tweet_posted,
+                )
+
+        tasks = [asyncio.create_task(process_feed_bounded(feed_url)) for feed_url in feeds]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                if await next_done:
+                    logger.info("Successfully posted one tweet, finishing process.")
+                    break
+            else:
+                logger.warning("No suitable articles found across all feeds.")
+        finally:
+            # Stop any feeds still fetching or waiting on the LLM
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     except Exception as e:
         logger.error(f"Error in main process: {str(e)}", exc_info=True)
@@ -173,7 +250,28 @@ async def main():
             logger.info("Closing RSS manager...")
             await rss_manager.close()
             logger.info("RSS manager closed")
+        if "chat_client" in locals():
+            logger.info("Closing xAI chat client...")
+            await chat_client.close()
+            await close_connector()
+            logger.info("xAI chat client closed")
+        if "twitter_bot" in locals():
+            logger.info("Closing Twitter bot...")
+            await twitter_bot.close()
+            logger.info("Twitter bot closed")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        import uvloop
+    except ImportError:
+        uvloop = None
+
+    log_listener.start()
+    try:
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
+    finally:
+        log_listener.stop()
@@ -10,14 +10,21 @@ def load_config() -> dict:
             "retry_multiplier": 1,
             "min_retry_wait": 4,
             "max_retry_wait": 10,
+            "max_rate_limit_wait": 900,
+            "max_total_rate_limit_wait": 900,
             "history_retention_days": 30,
             "article_freshness_hours": 24,
             "max_feeds_per_run": 25,
             "max_articles_per_feed": 5,
+            "feed_concurrency": 8,
+            "xai_concurrency": 4,
+            "twitter_concurrency": 5,
             "log_level": "INFO",
             "max_thread_length": 5,
             "min_thread_content_length": 100,
-            "thread_delay_seconds": 1
+            "max_prompt_chars": 2000,
+            "thread_delay_seconds": 1,
+            "twitter_get_ttl": 60
         }
     
     with open(config_path) as f:
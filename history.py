@@ -1,38 +1,92 @@
-import json
+import orjson
+import time
+from itertools import takewhile
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import List
 import asyncio
+from models import HASH_PREFIX
+
+# Rewrite the log once more than this fraction of its lines are expired entries
+COMPACTION_RATIO = 0.3
 
 class PostHistory:
-    def __init__(self, history_file: str = "posted_articles.json"):
+    def __init__(self, history_file: str = "posted_articles.jsonl"):
         self.history_file = Path(history_file)
-        self.posted_articles = self._load_history()
+        self._logged_entries = 0
+        # Membership set for is_posted, plus POSIX timestamps used only by cleanup
+        self._timestamps = self._load_history()
+        self._seen = set(self._timestamps)
+        self._has_legacy_hashes = self._contains_legacy_hashes()
         self._lock = asyncio.Lock()
 
     def _load_history(self) -> dict:
+        timestamps = {}
         if self.history_file.exists():
-            with open(self.history_file) as f:
-                history = json.load(f)
-                return {k: datetime.fromisoformat(v) for k, v in history.items()}
-        return {}
+            with open(self.history_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = orjson.loads(line)
+                    timestamps[entry["h"]] = datetime.fromisoformat(entry["t"]).timestamp()
+                    self._logged_entries += 1
+        return timestamps
+
+    @staticmethod
+    def _format_entry(article_hash: str, timestamp: float) -> bytes:
+        entry = {"h": article_hash, "t": datetime.fromtimestamp(timestamp).isoformat()}
+        return orjson.dumps(entry) + b"\n"
+
+    def _write_entry(self, line: bytes) -> None:
+        with open(self.history_file, 'ab') as f:
+            f.write(line)
+
+    def _write_history(self, lines: List[bytes]) -> None:
+        tmp_file = self.history_file.with_suffix(".tmp")
+        with open(tmp_file, 'wb') as f:
+            f.writelines(lines)
+        tmp_file.replace(self.history_file)
 
-    async def _save_history(self) -> None:
+    async def _append_history(self, article_hash: str) -> None:
+        line = self._format_entry(article_hash, self._timestamps[article_hash])
         async with self._lock:
-            with open(self.history_file, 'w') as f:
-                history = {k: v.isoformat() for k, v in self.posted_articles.items()}
-                json.dump(history, f, indent=2)
+            # File writes run in a worker thread so they never stall the event loop
+            await asyncio.to_thread(self._write_entry, line)
+            self._logged_entries += 1
+
+    async def _compact_history(self) -> None:
+        async with self._lock:
+            lines = [self._format_entry(k, v) for k, v in self._timestamps.items()]
+            await asyncio.to_thread(self._write_history, lines)
+            self._logged_entries = len(lines)
+
+    def _contains_legacy_hashes(self) -> bool:
+        return any(not k.startswith(HASH_PREFIX) for k in self._seen)
 
     def is_posted(self, article) -> bool:
-        return article.get_hash() in self.posted_articles
+        if article.get_hash() in self._seen:
+            return True
+        # Entries written before the xxh3 switch are keyed by MD5; they age out
+        # via cleanup_old_entries, after which this fallback is skipped
+        return self._has_legacy_hashes and article.get_legacy_hash() in self._seen
 
     async def add_posted(self, article) -> None:
-        self.posted_articles[article.get_hash()] = datetime.now()
-        await self._save_history()
+        article_hash = article.get_hash()
+        self._seen.add(article_hash)
+        self._timestamps[article_hash] = time.time()
+        await self._append_history(article_hash)
 
     async def cleanup_old_entries(self, days: int) -> None:
-        cutoff = datetime.now() - timedelta(days=days)
-        self.posted_articles = {
-            k: v for k, v in self.posted_articles.items()
-            if v > cutoff
-        }
-        await self._save_history()
+        cutoff = time.time() - days * 86400
+        # Entries are kept in the order they were posted, so expired ones form a
+        # prefix and the scan can stop at the first entry still within retention.
+        # An entry logged out of order is at worst kept until a later cleanup.
+        expired = list(takewhile(lambda k: self._timestamps[k] <= cutoff, self._timestamps))
+        for k in expired:
+            del self._timestamps[k]
+        self._seen.difference_update(expired)
+        self._has_legacy_hashes = self._contains_legacy_hashes()
+
+        stale_entries = self._logged_entries - len(self._timestamps)
+        if stale_entries > self._logged_entries * COMPACTION_RATIO:
+            await self._compact_history()
@@ -1,17 +1,31 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Optional
 from datetime import datetime, timedelta
 import hashlib
+import xxhash
 
-@dataclass
+HASH_PREFIX = "x3:"
+
+@dataclass(slots=True)
 class Article:
     title: str
     content: str
     url: str
     published_date: datetime
     feed_id: str
+    _hash: Optional[str] = field(default=None, init=False, repr=False, compare=False)
 
     def is_recent(self, hours: int) -> bool:
-        return datetime.now() - self.published_date < timedelta(hours=hours)
+        return self.published_after(datetime.now() - timedelta(hours=hours))
+
+    def published_after(self, cutoff: datetime) -> bool:
+        return self.published_date > cutoff
 
     def get_hash(self) -> str:
+        if self._hash is None:
+            self._hash = HASH_PREFIX + xxhash.xxh3_128_hexdigest(f"{self.url}{self.title}".encode())
+        return self._hash
+
+    def get_legacy_hash(self) -> str:
+        """MD5 hash used for history entries recorded before the xxh3 switch."""
         return hashlib.md5(f"{self.url}{self.title}".encode()).hexdigest()
@@ -0,0 +1,65 @@
+import orjson
+import hashlib
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import asyncio
+
+class ResponseCache:
+    """On-disk cache of generated xAI responses keyed by article and prompt."""
+
+    def __init__(self, cache_file: str = "generated_responses.json"):
+        self.cache_file = Path(cache_file)
+        self.responses = self._load_cache()
+        self._lock = asyncio.Lock()
+
+    def _load_cache(self) -> dict:
+        if self.cache_file.exists():
+            with open(self.cache_file, 'rb') as f:
+                cache = orjson.loads(f.read())
+                return {
+                    k: (v["response"], datetime.fromisoformat(v["created"]))
+                    for k, v in cache.items()
+                }
+        return {}
+
+    def _write_cache(self, cache: dict) -> None:
+        with open(self.cache_file, 'wb') as f:
+            f.write(orjson.dumps(cache, option=orjson.OPT_INDENT_2))
+
+    async def _save_cache(self) -> None:
+        async with self._lock:
+            cache = {
+                k: {"response": response, "created": created.isoformat()}
+                for k, (response, created) in self.responses.items()
+            }
+            # File writes run in a worker thread so they never stall the event loop
+            await asyncio.to_thread(self._write_cache, cache)
+
+    @staticmethod
+    def make_key(article, messages: List[Dict[str, str]]) -> str:
+        hasher = hashlib.blake2b(article.url.encode(), digest_size=16)
+        for message in messages:
+            hasher.update(b"\0")
+            hasher.update(message["content"].encode())
+        return hasher.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.responses.get(key)
+        return entry[0] if entry else None
+
+    async def set(self, key: str, response: str) -> None:
+        self.responses[key] = (response, datetime.now())
+        await self._save_cache()
+
+    async def discard(self, key: str) -> None:
+        if self.responses.pop(key, None) is not None:
+            await self._save_cache()
+
+    async def cleanup_old_entries(self, days: int) -> None:
+        cutoff = datetime.now() - timedelta(days=days)
+        self.responses = {
+            k: v for k, v in self.responses.items()
+            if v[1] > cutoff
+        }
+        await self._save_cache()
@@ -1,30 +1,43 @@
 import feedparser
 import aiohttp
+import orjson
+from lxml import etree
+from pathlib import Path
 from random import sample
-from urllib.parse import urlparse
-from typing import Optional, List
+from types import MappingProxyType
+from functools import lru_cache
+from email.utils import parsedate_to_datetime
+from typing import Optional, List, Dict, Tuple, AsyncIterator
 import logging
 import asyncio
-from datetime import datetime
+import os
+from datetime import datetime, timedelta, timezone
+from config import CONFIG
 from models import Article
+from history import PostHistory
 
 logger = logging.getLogger(__name__)
 
+_DEFAULT_HEADERS = MappingProxyType({
+    "User-Agent": "RSSFeedManager/1.0",
+})
+
 class RSSFeedManager:
-    def __init__(self, rss_file: str = "rss"):
+    def __init__(self, rss_file: str = "rss", cache_file: str = "feed_cache.json"):
         self.rss_file = rss_file
+        self.cache_file = Path(cache_file)
         self.feeds = self._load_feeds()
+        # HTTP validators (ETag/Last-Modified) and newest entry id of feeds
+        # that had nothing left to post
+        self._feed_cache = self._load_feed_cache()
+        # The same state from this run's responses, kept until the feed is exhausted
+        self._pending_cache: Dict[str, Dict[str, str]] = {}
         self._session: Optional[aiohttp.ClientSession] = None
 
     def _load_feeds(self) -> List[str]:
         """Load RSS feeds from the RSS file."""
         try:
-            with open(self.rss_file) as f:
-                feeds = [
-                    line.split()[0].strip()  # Take only the first part (URL) of each line
-                    for line in f
-                    if line.strip() and urlparse(line.split()[0].strip()).scheme in ["http", "https"]
-                ]
+            feeds = list(_parse_feeds_file(self.rss_file, os.path.getmtime(self.rss_file)))
             if not feeds:
                 raise ValueError("No valid feeds found in the RSS file.")
             logger.info(f"Loaded {len(feeds)} feeds.")
@@ -36,42 +49,80 @@ class RSSFeedManager:
             logger.error(f"Error loading feeds: {e}")
             raise
 
+    def _load_feed_cache(self) -> Dict[str, Dict[str, str]]:
+        if self.cache_file.exists():
+            with open(self.cache_file, 'rb') as f:
+                return orjson.loads(f.read())
+        return {}
+
+    def _write_feed_cache(self, feed_cache: bytes) -> None:
+        with open(self.cache_file, 'wb') as f:
+            f.write(feed_cache)
 
     async def _ensure_session(self):
         """Ensure that the aiohttp session is initialized."""
         if self._session is None:
-            headers = {
-                "User-Agent": "RSSFeedManager/1.0",
-            }
-            self._session = aiohttp.ClientSession(headers=headers)
+            self._session = aiohttp.ClientSession(headers=_DEFAULT_HEADERS)
 
     async def fetch_feed(self, feed_url: str) -> List[Article]:
         """Fetch and parse the RSS feed."""
         await self._ensure_session()
         try:
-            async with self._session.get(feed_url, timeout=aiohttp.ClientTimeout(total=30)) as response:
+            max_entries = CONFIG["max_articles_per_feed"]
+            cached = self._feed_cache.get(feed_url, {})
+            headers = {}
+            if "etag" in cached:
+                headers["If-None-Match"] = cached["etag"]
+            if "last_modified" in cached:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+            async with self._session.get(
+                feed_url, headers=headers, timeout=aiohttp.ClientTimeout(total=30)
+            ) as response:
+                if response.status == 304:
+                    logger.info(f"Feed unchanged since it was last exhausted: {feed_url}")
+                    return []
                 response.raise_for_status()
-                feed_content = await response.text()
+                feed_state = {
+                    key: response.headers[header]
+                    for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified"))
+                    if header in response.headers
+                }
+                last_top_id = cached.get("top_id")
+                received: List[bytes] = []
+                try:
+                    entries, reached_last_top = await self._parse_entries(
+                        response, max_entries, received, last_top_id
+                    )
+                except etree.XMLSyntaxError as e:
+                    logger.debug(f"Falling back to feedparser for {feed_url}: {e}")
+                    entries, reached_last_top = [], False
+                if not entries and not reached_last_top:
+                    # Reuse the bytes already streamed and read the rest of the body
+                    feed_content = b"".join(received) + await response.content.read()
+                    entries, reached_last_top = self._parse_entries_feedparser(
+                        feed_content, max_entries, last_top_id
+                    )
+
+            top_id = entries[0]["id"] if entries else last_top_id
+            if top_id:
+                feed_state["top_id"] = top_id
+            self._pending_cache[feed_url] = feed_state
 
-            parsed_feed = feedparser.parse(feed_content)
-            if not parsed_feed.entries:
-                logger.warning(f"No entries found in feed: {feed_url}")
+            if not entries:
+                if reached_last_top:
+                    logger.info(f"No entries newer than when the feed was last exhausted: {feed_url}")
+                else:
+                    logger.warning(f"No entries found in feed: {feed_url}")
                 return []
 
             articles = []
-            for entry in parsed_feed.entries:
-                published = entry.get("published_parsed") or entry.get("updated_parsed")
-                published_date = datetime(*published[:6]) if published else datetime.now()
-
+            for entry in entries:
                 articles.append(Article(
-                    title=entry.get("title", ""),
-                    url=entry.get("link", ""),
-                    content=(
-                        entry.get("summary", "")
-                        or entry.get("description", "")
-                        or ""
-                    ),
-                    published_date=published_date,
+                    title=entry["title"],
+                    url=entry["link"],
+                    content=entry["content"],
+                    published_date=entry["published_date"] or datetime.now(),
                     feed_id=feed_url,
                 ))
 
@@ -81,8 +132,136 @@ class RSSFeedManager:
             logger.error(f"Error fetching feed {feed_url}: {e}")
             return []
 
+    async def _parse_entries(
+        self,
+        response: aiohttp.ClientResponse,
+        max_entries: int,
+        received: List[bytes],
+        last_top_id: Optional[str],
+    ) -> Tuple[List[Dict], bool]:
+        """Parse up to max_entries RSS/Atom entries with lxml as the body streams in."""
+        # Chunks are kept in received so a fallback parser can reuse them. Parsing
+        # stops at last_top_id: it and everything below it were already exhausted.
+        # That assumes newest-first ordering, so the stop only applies once newer
+        # entries came before it; a feed that pins its first item would otherwise
+        # hide every new entry below the pin.
+        entries = []
+        parser = etree.XMLPullParser(events=("end",), tag=("{*}item", "{*}entry"))
+        async for chunk in response.content.iter_chunked(16 * 1024):
+            received.append(chunk)
+            parser.feed(chunk)
+            for _, elem in parser.read_events():
+                entry = self._parse_entry(elem)
+                # Free the parsed entry and any siblings already processed
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+                if entries and entry["id"] == last_top_id:
+                    return entries, True
+                entries.append(entry)
+                if len(entries) >= max_entries:
+                    return entries, False
+        parser.close()
+        return entries, False
+
+    def _parse_entry(self, elem: etree._Element) -> Dict:
+        """Extract the fields we use from an <item>/<entry> element."""
+        fields = {}
+        # Direct children only: nested markup belongs to its field, not the entry
+        for child in elem.iterchildren():
+            if not isinstance(child.tag, str):
+                continue
+            name = etree.QName(child).localname
+            if name == "link":
+                # Atom links carry the URL in href; prefer rel="alternate"
+                href = child.get("href")
+                if href and child.get("rel", "alternate") == "alternate":
+                    fields["link"] = href
+                elif not href and child.text:
+                    fields.setdefault("link", child.text.strip())
+            elif name not in fields:
+                if len(child):
+                    # Atom type="xhtml" wraps its text in a child <div>
+                    text = etree.tostring(child, method="text", encoding=str, with_tail=False)
+                else:
+                    text = child.text
+                if text and text.strip():
+                    fields[name] = text.strip()
+
+        return {
+            "id": fields.get("guid") or fields.get("id") or fields.get("link", ""),
+            "title": fields.get("title", ""),
+            "link": fields.get("link", ""),
+            "content": (
+                fields.get("summary", "")
+                or fields.get("description", "")
+                or fields.get("content", "")
+                or fields.get("encoded", "")
+            ),
+            "published_date": _parse_date(
+                fields.get("pubDate")
+                or fields.get("published")
+                or fields.get("updated")
+                or fields.get("date")
+            ),
+        }
+
+    def _parse_entries_feedparser(
+        self,
+        feed_content: bytes,
+        max_entries: int,
+        last_top_id: Optional[str],
+    ) -> Tuple[List[Dict], bool]:
+        """Parse entries with feedparser, which tolerates malformed feeds."""
+        # Sanitizing and URI resolution dominate feedparser's runtime and we use neither
+        parsed_feed = feedparser.parse(
+            feed_content, sanitize_html=False, resolve_relative_uris=False
+        )
+        entries = []
+        for entry in parsed_feed.entries[:max_entries]:
+            entry_id = entry.get("id") or entry.get("link", "")
+            # Same newest-first assumption as _parse_entries
+            if entries and entry_id == last_top_id:
+                return entries, True
+            published = entry.get("published_parsed") or entry.get("updated_parsed")
+            entries.append({
+                "id": entry_id,
+                "title": entry.get("title", ""),
+                "link": entry.get("link", ""),
+                "content": (
+                    entry.get("summary", "")
+                    or entry.get("description", "")
+                    or ""
+                ),
+                "published_date": datetime(*published[:6]) if published else None,
+            })
+        return entries, False
+
+    async def iter_candidates(
+        self,
+        feed_url: str,
+        freshness_hours: int,
+        post_history: PostHistory,
+    ) -> AsyncIterator[Article]:
+        """Yield articles from the feed that are recent and not yet posted."""
+        articles = await self.fetch_feed(feed_url)
+        # One cutoff per feed rather than a now() and timedelta per article
+        cutoff = datetime.now() - timedelta(hours=freshness_hours)
+        for article in articles:
+            if article.published_after(cutoff) and not post_history.is_posted(article):
+                yield article
+
+    def mark_exhausted(self, feed_url: str) -> None:
+        """Remember that the fetched feed had nothing to post, so an unchanged copy can be skipped."""
+        feed_state = self._pending_cache.pop(feed_url, None)
+        if feed_state:
+            self._feed_cache[feed_url] = feed_state
+        elif feed_state is not None:
+            self._feed_cache.pop(feed_url, None)
+
     async def close(self):
-        """Close the aiohttp session."""
+        """Persist feed validators and close the aiohttp session."""
+        await asyncio.to_thread(self._write_feed_cache, orjson.dumps(self._feed_cache))
         if self._session:
             await self._session.close()
             self._session = None
@@ -92,3 +271,29 @@ class RSSFeedManager:
         if not self.feeds:
             raise ValueError("No feeds available to select.")
         return sample(self.feeds, min(count, len(self.feeds)))
+
+
+@lru_cache(maxsize=None)
+def _parse_feeds_file(rss_file: str, mtime: float) -> Tuple[str, ...]:
+    """Parse feed URLs from the RSS file; cached until the file's mtime changes."""
+    with open(rss_file) as f:
+        # Take only the first part (URL) of each line
+        feeds = (line.split(None, 1)[0] for line in f if line.startswith(("http://", "https://")))
+        # Drop duplicate URLs so random sampling never picks the same feed twice
+        return tuple(dict.fromkeys(feeds))
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Parse an RFC 822 (RSS) or ISO 8601 (Atom) date into naive UTC."""
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
@@ -1,8 +1,14 @@
 from dataclasses import dataclass
 from typing import List
+from lxml import etree, html as lxml_html
+import html
 import re
 
-@dataclass
+_TAG_RE = re.compile(r'<[^>]+>')
+_EMOJI_RE = re.compile(r'[\U0001F300-\U0001F9FF]')
+_PARAGRAPH_SPLIT_RE = re.compile(r'\n\s*\n')
+
+@dataclass(slots=True)
 class ThreadPart:
     text: str
     media_id: str = None
@@ -38,7 +44,7 @@ class ThreadGenerator:
     def _create_hook(self, title: str) -> str:
         """Create an engaging hook from the title."""
         # Remove any existing emojis to add our own
-        title = re.sub(r'[\U0001F300-\U0001F9FF]', '', title)
+        title = _EMOJI_RE.sub('', title)
         return f"🧵 {title}"
 
     def _create_cta(self, url: str) -> str:
@@ -53,8 +59,8 @@ class ThreadGenerator:
     def _split_into_paragraphs(self, content: str) -> List[str]:
         """Split content into logical paragraphs."""
         # Remove HTML tags and split by double newlines
-        clean_content = re.sub(r'<[^>]+>', '', content)
-        paragraphs = [p.strip() for p in re.split(r'\n\s*\n', clean_content) if p.strip()]
+        clean_content = _strip_html(content)
+        paragraphs = [p.strip() for p in _PARAGRAPH_SPLIT_RE.split(clean_content) if p.strip()]
         return paragraphs
 
     def _split_into_tweets(self, text: str) -> List[str]:
@@ -96,4 +102,13 @@ class ThreadGenerator:
             else:
                 thread_parts.append(ThreadPart(text=text))
         
-        return thread_parts 
\ No newline at end of file
+        return thread_parts
+
+
+def _strip_html(text: str) -> str:
+    """Return the text content of an HTML fragment with entities decoded."""
+    try:
+        return lxml_html.fromstring(text).text_content()
+    except (etree.LxmlError, ValueError):
+        # Empty or malformed fragments; fall back to a plain tag strip
+        return html.unescape(_TAG_RE.sub('', text))
@@ -1,54 +1,226 @@
-from requests_oauthlib import OAuth1Session
+import aiohttp
+import oauthlib.oauth1
 import logging
+import orjson
 import asyncio
-from typing import List
-from dataclasses import dataclass
+import random
+import re
 import time
+from enum import Enum
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+from config import CONFIG
+from thread_generator import ThreadPart
 
 logger = logging.getLogger(__name__)
 
-@dataclass
-class ThreadPart:
-    text: str
-    media_id: str = None
-    reply_to_id: str = None
+TWEETS_URL = "https://api.twitter.com/2/tweets"
+
+_OK = frozenset({200, 201})
+_RETRYABLE = frozenset({429, 500, 502, 503, 504})
+# Server errors where the tweet may have been created anyway
+_AMBIGUOUS = frozenset({500, 502, 503, 504})
+
+MAX_TWEET_LENGTH = 280
+_LONE_SURROGATE_RE = re.compile(r"[\ud800-\udfff]")
+
+class PostResult(Enum):
+    """Outcome of post_tweet/post_thread."""
+    OK = "ok"
+    REJECTED = "rejected"  # Twitter refused the text itself; reposting it won't help
+    FAILED = "failed"  # Gave up on retries or errored; the same text may succeed later
 
 class TwitterBot:
-    def __init__(self, oauth_session: OAuth1Session):
-        self.oauth = oauth_session
+    def __init__(
+        self,
+        consumer_key: str,
+        consumer_secret: str,
+        access_token: str,
+        access_token_secret: str,
+    ):
+        self._oauth = oauthlib.oauth1.Client(
+            consumer_key,
+            client_secret=consumer_secret,
+            resource_owner_key=access_token,
+            resource_owner_secret=access_token_secret,
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Caps in-flight Twitter requests below the connector's pool size
+        self._semaphore = asyncio.Semaphore(CONFIG.get("twitter_concurrency", 5))
+        # GET responses by (url, query), stored with their expiry time
+        self._get_cache: Dict[Tuple, Tuple[float, dict]] = {}
+        self._get_ttl = CONFIG.get("twitter_get_ttl", 60)
+        # (remaining, reset epoch) from the last successful post's rate-limit headers
+        self._rate_state: Optional[Tuple[int, float]] = None
+
+    async def _ensure_session(self):
+        """Ensure that the aiohttp session is initialized."""
+        if self._session is None or self._session.closed:
+            # Keep connections to api.twitter.com warm between thread parts
+            connector = aiohttp.TCPConnector(limit=20, keepalive_timeout=75)
+            self._session = aiohttp.ClientSession(connector=connector)
+
+    async def _post(self, body: bytes) -> aiohttp.ClientResponse:
+        """Sign and send a serialized tweet payload, returning the response with its body read."""
+        await self._ensure_session()
+        # OAuth1 needs a fresh nonce and timestamp per request, so sign every attempt.
+        # JSON bodies are not part of the signature.
+        _, headers, _ = self._oauth.sign(
+            TWEETS_URL,
+            http_method="POST",
+            headers={"Content-Type": "application/json"},
+        )
+        async with self._semaphore, self._session.post(
+            TWEETS_URL,
+            data=body,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=30),
+        ) as response:
+            await response.read()
+            return response
+
+    async def get(self, url: str, params: Optional[dict] = None) -> dict:
+        """GET a read-only endpoint, serving repeats within the TTL from memory."""
+        query = tuple(sorted((params or {}).items()))
+        key = (url, query)
+        now = time.monotonic()
+        cached = self._get_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        await self._ensure_session()
+        signed_url, headers, _ = self._oauth.sign(
+            f"{url}?{urlencode(query)}" if query else url,
+            http_method="GET",
+        )
+        async with self._semaphore, self._session.get(
+            signed_url,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=30),
+        ) as response:
+            response.raise_for_status()
+            result = orjson.loads(await response.read())
+
+        if len(self._get_cache) >= 1024:
+            self._get_cache = {k: v for k, v in self._get_cache.items() if v[0] > now}
+        self._get_cache[key] = (now + self._get_ttl, result)
+        return result
+
+    @staticmethod
+    def _rate_limit_delay(response: aiohttp.ClientResponse, fallback: float) -> float:
+        """Seconds to wait after a 429, preferring what Twitter tells us."""
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return int(retry_after)
+        if retry_after:
+            try:
+                return parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+        reset = response.headers.get("x-rate-limit-reset", "")
+        if reset.isdigit():
+            return int(reset) - time.time()
+        # Jitter keeps concurrent posters from retrying in lockstep
+        return fallback * (1 + random.random())
 
-    def _exponential_backoff_retry(self, request_func, max_retries=5):
+    async def _exponential_backoff_retry(
+        self, request_func, max_retries=5, retry_ambiguous=True
+    ) -> Tuple[PostResult, Optional[aiohttp.ClientResponse]]:
         """Execute request with exponential backoff retry logic."""
         retry_delay = 10  # start with 10 seconds delay
+        max_wait = CONFIG.get("max_rate_limit_wait", 900)
+        # Total sleep allowed per post, so one stuck tweet can't stall the run for an hour
+        wait_budget = CONFIG.get("max_total_rate_limit_wait", 900)
+        # POST /2/tweets isn't idempotent: after a 5xx the tweet may exist, so a 403
+        # duplicate on a later attempt is our own tweet. Callers that can't accept
+        # that (no response, so no tweet id) pass retry_ambiguous=False.
+        after_ambiguous = False
         for attempt in range(max_retries):
-            response = request_func()
-            if response.status_code == 201:
-                return response
-            elif response.status_code == 429:
-                logger.warning(f"Rate limit exceeded, retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-                retry_delay *= 2  # double the delay for the next attempt
-            else:
-                logger.error(f"Failed to post tweet with status {response.status_code}: {response.text}")
-                break
-        return None
-
-    async def post_tweet(self, tweet_text: str) -> bool:
+            response = await request_func()
+            status = response.status
+            if status in _OK:
+                return PostResult.OK, response
+            if after_ambiguous and status == 403 and "duplicate" in (await response.text()).lower():
+                logger.warning("Tweet was already created by an earlier attempt")
+                return PostResult.OK, None
+            if status in _AMBIGUOUS:
+                if not retry_ambiguous:
+                    logger.error("Twitter returned %s; not retrying as the tweet may already exist", status)
+                    return PostResult.FAILED, None
+                after_ambiguous = True
+            if status in _RETRYABLE:
+                if status == 429:
+                    delay = self._rate_limit_delay(response, retry_delay)
+                else:
+                    # Rate-limit headers ride along on 5xx too but say nothing about the outage
+                    delay = retry_delay * (1 + random.random())
+                delay = min(max(delay, 0), max_wait)
+                if attempt == max_retries - 1:
+                    logger.error("Twitter returned %s, giving up after %d attempts", status, max_retries)
+                    return PostResult.FAILED, None
+                if delay > wait_budget:
+                    logger.error(
+                        "Twitter returned %s, retry wait of %.0f seconds exceeds the remaining budget",
+                        status, delay,
+                    )
+                    return PostResult.FAILED, None
+                logger.warning("Twitter returned %s, retrying in %.0f seconds...", status, delay)
+                await asyncio.sleep(delay)
+                wait_budget -= delay
+                retry_delay *= 2
+                continue
+            # Only decode the error body when the record will actually be emitted
+            if logger.isEnabledFor(logging.ERROR):
+                body = await response.text()
+                logger.error("Failed to post tweet with status %s: %.2048s", status, body)
+            return PostResult.REJECTED, None
+        return PostResult.FAILED, None
+
+    def _record_rate_state(self, response: aiohttp.ClientResponse) -> None:
+        remaining = response.headers.get("x-rate-limit-remaining", "")
+        reset = response.headers.get("x-rate-limit-reset", "")
+        self._rate_state = (
+            int(remaining) if remaining.isdigit() else 1,
+            int(reset) if reset.isdigit() else time.time() + 60,
+        )
+
+    def _compute_delay(self) -> float:
+        """Spread the remaining quota over the reset window, capped at thread_delay_seconds."""
+        max_delay = CONFIG["thread_delay_seconds"]
+        if self._rate_state is None:
+            return max_delay
+        remaining, reset = self._rate_state
+        return min(max(0, (reset - time.time()) / max(remaining, 1)), max_delay)
+
+    async def post_tweet(self, tweet_text: str) -> PostResult:
         """Post a single tweet with retry logic."""
         try:
-            response = self._exponential_backoff_retry(
-                lambda: self.oauth.post(
-                    "https://api.twitter.com/2/tweets",
-                    json={"text": tweet_text}
-                )
+            result, _ = await self._exponential_backoff_retry(
+                lambda body=orjson.dumps({"text": tweet_text}): self._post(body)
             )
-            return response is not None and response.status_code == 201
+            return result
         except Exception as e:
-            logger.error(f"Error posting tweet: {str(e)}")
-            return False
+            logger.error("Error posting tweet: %s", e)
+            return PostResult.FAILED
 
-    async def post_thread(self, thread_parts: List[ThreadPart]) -> bool:
+    @staticmethod
+    def _validate_thread_parts(thread_parts: List[ThreadPart]) -> bool:
+        """Check every part up front so a bad one can't strand a half-posted thread."""
+        for i, part in enumerate(thread_parts):
+            if not part.text or len(part.text) > MAX_TWEET_LENGTH:
+                logger.error("Invalid thread part %d: len=%d", i, len(part.text or ""))
+                return False
+            if _LONE_SURROGATE_RE.search(part.text):
+                logger.error("Invalid thread part %d: contains a lone surrogate", i)
+                return False
+        return True
+
+    async def post_thread(self, thread_parts: List[ThreadPart]) -> PostResult:
         """Post a thread of tweets with retry logic."""
+        if not self._validate_thread_parts(thread_parts):
+            return PostResult.REJECTED
+
         previous_tweet_id = None
         
         try:
@@ -57,25 +229,32 @@ class TwitterBot:
                 if previous_tweet_id:
                     payload["reply"] = {"in_reply_to_tweet_id": previous_tweet_id}
                 
-                response = self._exponential_backoff_retry(
-                    lambda: self.oauth.post(
-                        "https://api.twitter.com/2/tweets",
-                        json=payload
-                    )
+                # Serialized once per part; the default arg pins it for every retry.
+                # A 5xx isn't retried: a duplicate would leave no id to chain from.
+                result, response = await self._exponential_backoff_retry(
+                    lambda body=orjson.dumps(payload): self._post(body),
+                    retry_ambiguous=False,
                 )
                 
-                if not response or response.status_code != 201:
-                    return False
+                if result is not PostResult.OK:
+                    return result
                 
-                response_data = response.json()
+                response_data = await response.json(loads=orjson.loads)
                 previous_tweet_id = response_data["data"]["id"]
-                logger.info(f"Posted tweet part: {part.text[:50]}...")
+                self._record_rate_state(response)
+                logger.info("Posted tweet part: %.50s...", part.text)
                 
-                # Add small delay between tweets to avoid rate limits
-                await asyncio.sleep(CONFIG["thread_delay_seconds"])
+                # Pace the next part by how much rate-limit quota is left
+                await asyncio.sleep(self._compute_delay())
             
-            return True
+            return PostResult.OK
             
         except Exception as e:
-            logger.error(f"Error posting thread: {str(e)}")
-            return False
+            logger.error("Error posting thread: %s", e)
+            return PostResult.FAILED
+
+    async def close(self):
+        """Close the aiohttp session."""
+        if self._session:
+            await self._session.close()
+            self._session = None
@@ -1,25 +1,132 @@
 import aiohttp
+import asyncio
+import hashlib
+import orjson
+import ssl
+from types import MappingProxyType
 from typing import List, Dict, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 import logging
 from config import CONFIG  # Reuse the CONFIG object from config.py
 
 logger = logging.getLogger(__name__)
 
+# Built once per process so new sessions skip SSLContext setup
+_SSL_CTX = ssl.create_default_context()
+_CONNECTOR: Optional[aiohttp.TCPConnector] = None
+
+def _get_connector() -> aiohttp.TCPConnector:
+    """Return the process-wide connector, creating it on first use."""
+    global _CONNECTOR
+    if _CONNECTOR is None or _CONNECTOR.closed:
+        _CONNECTOR = aiohttp.TCPConnector(
+            ssl=_SSL_CTX,
+            # Sized like the request semaphore so the pool never queues behind it
+            limit=CONFIG.get("xai_concurrency", 4),
+            use_dns_cache=True,
+            ttl_dns_cache=600,
+            keepalive_timeout=75,
+        )
+    return _CONNECTOR
+
+class _LeaderCancelled(Exception):
+    """The shared request a caller was waiting on was cancelled by its owner."""
+
+def _is_transient(exc: BaseException) -> bool:
+    """Whether a failed chat request is worth retrying."""
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status in {429, 500, 502, 503, 504}
+    return isinstance(exc, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+async def close_connector():
+    """Close the shared connector once every XAIChat session is done with it."""
+    global _CONNECTOR
+    if _CONNECTOR is not None:
+        await _CONNECTOR.close()
+        _CONNECTOR = None
+
 class XAIChat:
     """Enhanced client for interacting with the xAI API."""
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_concurrency: int = CONFIG.get("xai_concurrency", 4)):
         if not api_key:
             raise ValueError("API key cannot be empty")
         self.api_key = api_key
         self.base_url = "https://api.x.ai/v1"
-        self.headers = {
+        self.headers = MappingProxyType({
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
+        })
+        self.max_concurrency = max_concurrency
+        # Caps in-flight completions so the feed fan-out can't stampede the API
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Identical requests already on the wire, keyed by a hash of the payload
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def _ensure_session(self):
+        """Ensure that the aiohttp session is initialized."""
+        if self._session is None or self._session.closed:
+            # The connector outlives the session so DNS and TLS state carry over
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=_get_connector(),
+                connector_owner=False,
+            )
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7
+    ) -> Optional[str]:
+        """Send a chat request, sharing one API call among identical concurrent requests."""
+        data = {
+            "messages": messages,
+            "model": "grok-beta",  # Replace with the appropriate model name if needed
+            "temperature": temperature
         }
+        # Serialized once here so retries resend the same bytes
+        body = orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        key = hashlib.blake2b(body, digest_size=16).hexdigest()
+        while (inflight := self._inflight.get(key)) is not None:
+            try:
+                # Shielded so a cancelled follower doesn't cancel the shared result
+                return await asyncio.shield(inflight)
+            except _LeaderCancelled:
+                # The owner's task was cancelled; take over the request ourselves
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._chat(body)
+        except asyncio.CancelledError:
+            # Followers get a plain exception to retry on, not our cancellation
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Re-raised below, so don't warn if no one else waited
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    async def chat_batch(
+        self,
+        messages_list: List[List[Dict[str, str]]],
+        temperature: float = 0.7
+    ) -> List[Optional[str]]:
+        """Send several independent chat requests concurrently over the shared session."""
+        return await asyncio.gather(
+            *(self.chat(messages, temperature) for messages in messages_list)
+        )
 
     @retry(
+        retry=retry_if_exception(_is_transient),
         stop=stop_after_attempt(CONFIG['max_retries']),
         wait=wait_exponential(
             multiplier=CONFIG['retry_multiplier'],
@@ -27,29 +134,32 @@ class XAIChat:
             max=CONFIG['max_retry_wait']
         )
     )
-    async def chat(
-        self,
-        messages: List[Dict[str, str]],
-        temperature: float = 0.7
-    ) -> Optional[str]:
-        """Send a chat request to the xAI API with retry logic."""
+    async def _chat(self, body: bytes) -> Optional[str]:
+        """Send a serialized chat request to the xAI API with retry logic."""
         try:
-            data = {
-                "messages": messages,
-                "model": "grok-beta",  # Replace with the appropriate model name if needed
-                "temperature": temperature
-            }
-
-            async with aiohttp.ClientSession(headers=self.headers) as session:
-                async with session.post(
+            await self._ensure_session()
+            async with self._semaphore:
+                async with self._session.post(
                     f"{self.base_url}/chat/completions",
-                    json=data,
+                    data=body,  # Content-Type comes from the session headers
                     timeout=aiohttp.ClientTimeout(total=30)
                 ) as response:
                     response.raise_for_status()
-                    result = await response.json()
+                    result = orjson.loads(await response.read())
                     return result['choices'][0]['message']['content']
 
         except Exception as e:
-            logger.error(f"Error in chat request: {str(e)}")
+            logger.error("Error in chat request: %s", e)
             raise
+
+    async def close(self):
+        """Close the aiohttp session."""
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "XAIChat":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()